@@ -0,0 +1,73 @@
+"""
+Response cache for Gemini prompts.
+An in-memory LRU sits in front of an optional on-disk store (diskcache),
+so identical requests are answered locally, even after a restart.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Optional persistent store
+try:
+    import diskcache
+    DISK_CACHE_ENABLED = True
+except ImportError:
+    DISK_CACHE_ENABLED = False
+
+MEMORY_ENTRIES = 512
+DISK_CACHE_DIR = "./.gemini_cache"
+
+_lock = threading.Lock()
+_memory = OrderedDict()
+_disk = None
+
+def make_key(*parts: str) -> str:
+    """Hash the parts that determine a response into a short cache key."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+def _get_disk():
+    global _disk
+    if DISK_CACHE_ENABLED and _disk is None:
+        with _lock:
+            if _disk is None:
+                _disk = diskcache.Cache(DISK_CACHE_DIR)
+    return _disk
+
+def _remember(key: str, value: str) -> None:
+    with _lock:
+        _memory[key] = value
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+
+def get(key: str):
+    """Cached response for key, or None."""
+    with _lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return _memory[key]
+
+    disk = _get_disk()
+    if disk is None:
+        return None
+    try:
+        value = disk.get(key)
+    except Exception:
+        return None
+    if value is not None:
+        _remember(key, value)
+    return value
+
+def put(key: str, value: str) -> None:
+    """Store a response in memory and, when available, on disk."""
+    _remember(key, value)
+    disk = _get_disk()
+    if disk is not None:
+        try:
+            disk.set(key, value)
+        except Exception:
+            pass
@@ -0,0 +1,54 @@
+"""
+PDF text-layer extraction, one string per page.
+Kept free of Gemini and Streamlit imports: main.py hands long documents to
+worker processes, and each spawned worker only has to import this module.
+"""
+import io
+import threading
+
+from pypdf import PdfReader
+
+# Optional fast PDF text extraction (PDFium); pypdf is the fallback
+try:
+    import pypdfium2 as pdfium
+    PDFIUM_ENABLED = True
+except ImportError:
+    PDFIUM_ENABLED = False
+
+# PDFium is not thread-safe, so calls into it are serialized across the extraction threads.
+_PDFIUM_LOCK = threading.Lock()
+
+def page_count(content: bytes) -> int:
+    if PDFIUM_ENABLED:
+        try:
+            with _PDFIUM_LOCK:
+                pdf = pdfium.PdfDocument(content)
+                try:
+                    return len(pdf)
+                finally:
+                    pdf.close()
+        except Exception:
+            pass  # Fall back to pypdf
+    return len(PdfReader(io.BytesIO(content)).pages)
+
+def pdfium_pages(content: bytes, start: int, end: int) -> list:
+    """Text of pages [start, end) read with PDFium; errors propagate."""
+    with _PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(content)
+        try:
+            pages = []
+            for i in range(start, end):
+                page = pdf[i]
+                textpage = page.get_textpage()
+                pages.append(textpage.get_text_range().replace("\r\n", "\n"))
+                textpage.close()
+                page.close()
+        finally:
+            pdf.close()
+    return pages
+
+def pypdf_pages(content: bytes, start: int, end: int) -> list:
+    """Text of pages [start, end) read with pypdf; errors propagate."""
+    # "plain" is pypdf's fast mode; layout reconstruction isn't needed for analysis prompts.
+    reader = PdfReader(io.BytesIO(content))
+    return [reader.pages[i].extract_text(extraction_mode="plain") or "" for i in range(start, end)]
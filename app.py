@@ -1,15 +1,33 @@
 # app_with_square_cards.py
+import asyncio
+import gc
+import hashlib
+import json
+import os
+import time
+import zlib
+from functools import lru_cache
+
 import streamlit as st
-from main import (
-    extract_text_from_pdfs, ask_gemini, simplify_text, summarize_text,
-    translate_text, detect_document_type, extract_key_entities,
-    generate_compliance_checklist, explain_complex_terms, risk_assessment
-)
 
 st.set_page_config(page_title="Legal Document AI Assistant", page_icon="⚖️", layout="wide")
 
+# Analysis results are cached per (document, tool, doc_type, language) so repeat
+# clicks and re-uploads of the same PDF don't go back to Gemini.
+CACHE_DIR = os.path.join(".cache", "llm")
+
+# ---------- Backend ----------
+@st.cache_resource(show_spinner=False)
+def _tools():
+    """
+    Import the Gemini/PDF backend on first use. Keeps the Google SDK imports
+    off the first paint; later reruns get the cached module back.
+    """
+    import main
+    return main
+
 # ---------- Styling ----------
-st.markdown("""
+_CSS = """
 <style>
 @import url('https://fonts.googleapis.com/css2?family=Poppins:wght@300;400;600;700&display=swap');
 
@@ -83,7 +101,14 @@ div[data-testid="stSidebar"] .stButton > button:hover {
     filter: brightness(1.1);
 }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+@st.cache_resource(show_spinner=False)
+def inject_css():
+    # The cached call is replayed on every rerun, so the stylesheet is not rebuilt each time.
+    st.markdown(_CSS, unsafe_allow_html=True)
+
+inject_css()
 
 # ---------- Header ----------
 st.markdown("""
@@ -98,28 +123,165 @@ with st.sidebar:
     st.header("📂 Upload & Settings")
     uploaded_files = st.file_uploader("Upload PDF(s)", type=["pdf"], accept_multiple_files=True)
     language = st.selectbox("Answer language", ["English", "Hindi", "Marathi"], index=0)
+    context_chars = st.slider("Max context (chars)", 4000, 100000, 4000, step=1000,
+                              help="How much of the document Key Information and Risk Assessment send to Gemini")
     if st.button("🗑️ Clear Session"):
-        for k in ['pdf_text', 'doc_type', 'chat_history']:
-            if k in st.session_state:
-                del st.session_state[k]
-        st.experimental_rerun()
+        _tools().delete_document_cache(st.session_state.get("gemini_cache", ""))
+        st.session_state.clear()
+        gc.collect()  # release the previous document's text before the rerun
+        st.rerun()
 
 # ---------- Initialize session ----------
-if "pdf_text" not in st.session_state: st.session_state.pdf_text = ""
-if "doc_type" not in st.session_state: st.session_state.doc_type = ""
-if "chat_history" not in st.session_state: st.session_state.chat_history = []
+st.session_state.setdefault("pdf_text_z", b"")  # zlib-compressed document text
+st.session_state.setdefault("doc_type", "")
+st.session_state.setdefault("chat_history", [])
+st.session_state.setdefault("doc_hash", "")
+st.session_state.setdefault("llm_cache", {})  # key -> zlib-compressed result
+st.session_state.setdefault("gemini_cache", "")
+st.session_state.setdefault("gemini_cache_created", 0.0)
+
+# Everything session state holds that can be as large as the document (the text, the prompts
+# embedding its windows, cached results) is stored zlib-compressed.
+def _compress(text):
+    return zlib.compress(text.encode("utf-8"), 6) if text else b""
+
+@lru_cache(maxsize=1)
+def _decompress(data):
+    return zlib.decompress(data).decode("utf-8") if data else ""
+
+def doc_text():
+    """The uploaded document's text. Session state keeps it compressed; decoded at most once per rerun."""
+    return _decompress(st.session_state.pdf_text_z)
+
+def context_cache():
+    """Name of the Gemini cached context for this document, or "" if there is none or it has expired."""
+    if time.time() - st.session_state.gemini_cache_created > _tools().CACHE_TTL_SECONDS - 60:
+        return ""
+    return st.session_state.gemini_cache
+
+# ---------- Result cache ----------
+def _cache_key(tool):
+    parts = [st.session_state.doc_hash, tool, st.session_state.doc_type, language]
+    if tool in _tools().WINDOWED_ANALYSES:  # depends on the "Max context" slider
+        parts.append(str(context_chars))
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+def cache_lookup(tool):
+    """Cached result for the current document, tool and language, or None on a miss."""
+    key = _cache_key(tool)
+    cache = st.session_state.llm_cache
+    if key in cache:
+        return zlib.decompress(cache[key]).decode("utf-8")
+
+    try:
+        with open(os.path.join(CACHE_DIR, f"{key}.json"), encoding="utf-8") as f:
+            result = json.load(f)["result"]
+    except (OSError, ValueError, KeyError):
+        return None
+    cache[key] = _compress(result)
+    return result
+
+def cache_store(tool, result):
+    """Store a successful result in the session cache and on disk."""
+    key = _cache_key(tool)
+    st.session_state.llm_cache[key] = _compress(result)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(os.path.join(CACHE_DIR, f"{key}.json"), "w", encoding="utf-8") as f:
+            json.dump({"tool": tool, "language": language, "result": result}, f, ensure_ascii=False)
+    except OSError:
+        pass
+
+def cached_analysis(tool, compute, error_prefix, translate=True, stream=None):
+    """
+    Return the text of `compute()`'s GeminiResult for the current document, tool and language.
+    Checks the in-session cache, then the on-disk JSON cache, and only calls
+    Gemini on a miss. A failure is shown after `error_prefix` and never cached, so the next click retries.
+    If `stream` is given it is used instead of `compute` and shown live while it generates.
+    """
+    text = cache_lookup(tool)
+    if text is not None:
+        return text
+
+    if _tools().gemini_queue_full():
+        st.toast("Gemini is busy with other requests; yours is queued.")
+    if stream is not None:
+        # Show the English answer as it streams; for other languages it stays
+        # on screen until the translation below replaces it.
+        live = st.empty()
+        gemini_stream = stream()
+        with live.container():
+            st.write_stream(gemini_stream)
+        result = gemini_stream.result
+    else:
+        live = None
+        result = compute()
+    if result.ok and translate and language != "English":
+        translated = asyncio.run(_tools().translate_text_parallel(result.text, language))
+        if translated.ok:
+            result = translated
+        else:
+            # Keep the English answer, with the translation error under it.
+            result = _tools().GeminiResult(False, result.text, translated.error)
+            error_prefix = f"Translation to {language} failed: "
+    if live is not None:
+        live.empty()
+    if result.ok:
+        cache_store(tool, result.text)
+    return result.message(error_prefix)
+
+# ---------- Analysis prompts ----------
+def analysis_prompts():
+    """
+    Analysis prompts for the current document and the Gemini cache name they were built for.
+    Built once per document and only rebuilt when the cached context or the context window changes.
+    """
+    cache_name = context_cache()
+    key = (st.session_state.doc_hash, st.session_state.doc_type, cache_name, context_chars)
+    if st.session_state.get("prompts_key") != key:
+        prompts = _tools().build_analysis_prompts(doc_text(), st.session_state.doc_type, cache_name, context_chars)
+        st.session_state.prompts_z = _compress(json.dumps(prompts))
+        st.session_state.prompts_key = key
+        return prompts, cache_name
+    return json.loads(zlib.decompress(st.session_state.prompts_z)), cache_name
+
+def run_tool(title):
+    """Run one of the analyses in main.ANALYSES through the result cache."""
+    if not _tools().is_analyzable(doc_text()):
+        return _tools().INSUFFICIENT_CONTENT
+    prompts, cache_name = analysis_prompts()
+    return cached_analysis(
+        title,
+        lambda: _tools().run_analysis(prompts[title], cache_name),
+        _tools().ANALYSES[title][1],
+        stream=lambda: _tools().run_analysis_stream(prompts[title], cache_name))
+
+# ---------- Cached processing ----------
+def extract_uploaded_text(files):
+    """Extract text from uploaded PDFs, reusing the on-disk result for files seen before."""
+    return _tools().extract_text_from_pdfs(files, on_cache_hit=lambda: st.toast("Loaded from cache"))
 
 # ---------- Process uploads ----------
-if uploaded_files and not st.session_state.pdf_text:
-    with st.spinner("Processing documents..."):
-        st.session_state.pdf_text = extract_text_from_pdfs(uploaded_files)
-        st.session_state.doc_type = detect_document_type(st.session_state.pdf_text)
+if uploaded_files and not st.session_state.pdf_text_z:
+    with st.spinner(f"Processing {len(uploaded_files)} document(s) in parallel..."):
+        progress = st.progress(0.0, text="Extracting text...")
+        text = extract_uploaded_text(uploaded_files)
+        st.session_state.pdf_text_z = _compress(text)
+        st.session_state.doc_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        progress.progress(1 / 3, text="Detecting document type...")
+        st.session_state.doc_type = _tools().detect_document_type(text)
+        progress.progress(2 / 3, text="Preparing analysis context...")
+        st.session_state.gemini_cache = _tools().create_document_cache(text)
+        st.session_state.gemini_cache_created = time.time()
+        analysis_prompts()
+        progress.empty()
     st.success("Document processing complete!")
     st.balloons()
 
 # ---------- Show doc type ----------
 if st.session_state.doc_type:
-    st.markdown(f"<div style='margin-top:10px;'><strong>Document type:</strong> {st.session_state.doc_type}</div>", unsafe_allow_html=True)
+    # Gemini output: render as plain markdown, never as raw HTML.
+    st.markdown(f"**Document type:** {st.session_state.doc_type}")
 
 # ---------- Analysis Tools ----------
 st.markdown("<h3 style='margin-top:18px;'>Quick Analysis Tools</h3>", unsafe_allow_html=True)
@@ -127,83 +289,123 @@ st.markdown("<div class='analysis-grid'>", unsafe_allow_html=True)
 
 # 1 Key Information
 if st.button("📝 Key Information", key="btn_key", help="Extract key parties, dates, obligations"):
-    if not st.session_state.pdf_text:
+    if not st.session_state.pdf_text_z:
         st.warning("Upload a document first.")
     else:
         with st.spinner("Extracting key information..."):
-            res = extract_key_entities(st.session_state.pdf_text, st.session_state.doc_type)
-            if language != "English":
-                res = translate_text(res, language)
+            res = run_tool("Key Information")
             st.session_state.chat_history.append(("Key Information", res))
             st.success("Key information extracted")
 
 # 2 Action Checklist
 if st.button("✅ Action Checklist", key="btn_check", help="Generate practical checklist for compliance"):
-    if not st.session_state.pdf_text:
+    if not st.session_state.pdf_text_z:
         st.warning("Upload a document first.")
     else:
         with st.spinner("Generating checklist..."):
-            res = generate_compliance_checklist(st.session_state.pdf_text, st.session_state.doc_type)
-            if language != "English":
-                res = translate_text(res, language)
+            res = run_tool("Action Checklist")
             st.session_state.chat_history.append(("Action Checklist", res))
             st.success("Checklist generated")
 
 # 3 Risk Assessment
 if st.button("⚠️ Risk Assessment", key="btn_risk", help="Identify potential risks and issues"):
-    if not st.session_state.pdf_text:
+    if not st.session_state.pdf_text_z:
         st.warning("Upload a document first.")
     else:
         with st.spinner("Running risk assessment..."):
-            res = risk_assessment(st.session_state.pdf_text, st.session_state.doc_type)
-            if language != "English":
-                res = translate_text(res, language)
+            res = run_tool("Risk Assessment")
             st.session_state.chat_history.append(("Risk Assessment", res))
             st.success("Risk assessment complete")
 
 # 4 Explain Terms
 if st.button("📖 Explain Terms", key="btn_terms", help="Explain complex/legal terms in plain language"):
-    if not st.session_state.pdf_text:
+    if not st.session_state.pdf_text_z:
         st.warning("Upload a document first.")
     else:
         with st.spinner("Explaining terms..."):
-            res = explain_complex_terms(st.session_state.pdf_text, st.session_state.doc_type)
-            if language != "English":
-                res = translate_text(res, language)
+            res = run_tool("Explain Terms")
             st.session_state.chat_history.append(("Explain Terms", res))
             st.success("Terms explained")
 
 # 5 Summary
 if st.button("📝 Summary", key="btn_summary", help="Generate a concise comprehensive summary"):
-    if not st.session_state.pdf_text:
+    if not st.session_state.pdf_text_z:
         st.warning("Upload a document first.")
     else:
         with st.spinner("Summarizing..."):
-            res = summarize_text(st.session_state.pdf_text, st.session_state.doc_type)
-            if language != "English":
-                res = translate_text(res, language)
+            res = run_tool("Summary")
             st.session_state.chat_history.append(("Summary", res))
             st.success("Summary generated")
 
 # 6 Translate Document
 if st.button("🌐 Translate", key="btn_translate", help="Translate extracted content to chosen language"):
-    if not st.session_state.pdf_text:
+    if not st.session_state.pdf_text_z:
         st.warning("Upload a document first.")
     else:
         with st.spinner("Translating..."):
-            res = translate_text(st.session_state.pdf_text[:4000], language)
+            res = cached_analysis(
+                "Translation",
+                lambda: asyncio.run(_tools().translate_text_parallel(doc_text()[:4000], language)),
+                f"Translation to {language} failed: ",
+                translate=False)
             st.session_state.chat_history.append(("Translation", res))
             st.success("Translation complete")
 
+# 7 Run All
+if st.button("🚀 Run All Analyses", key="btn_all", help="Run every tool above at once"):
+    if not st.session_state.pdf_text_z:
+        st.warning("Upload a document first.")
+    elif not _tools().is_analyzable(doc_text()):
+        st.warning(_tools().INSUFFICIENT_CONTENT)
+    else:
+        with st.spinner("Running all analyses..."):
+            # Bind the inputs now: the calls run in worker threads, which can't read session_state.
+            tools = _tools()
+            prompts, cache_name = analysis_prompts()
+            calls = {
+                title: (lambda title=title: tools.run_analysis(prompts[title], cache_name))
+                for title in tools.ANALYSES
+            }
+
+            results = {title: cache_lookup(title) for title in [*calls, "Translation"]}
+            pending = {title: call for title, call in calls.items() if results[title] is None}
+            if pending and tools.gemini_queue_full():
+                st.toast("Gemini is busy with other requests; yours are queued.")
+            fresh = asyncio.run(tools.run_concurrently(pending))
+
+            translation_failed = f"Translation to {language} failed: "
+            error_prefixes = {title: prefix for title, (_, prefix) in tools.ANALYSES.items()}
+            error_prefixes["Translation"] = translation_failed
+
+            # One batched call translates every new English result plus the document excerpt;
+            # failures stay in English and are not cached, so the next run retries them.
+            if results["Translation"] is None:
+                fresh["Translation"] = tools.GeminiResult(True, doc_text()[:4000])
+            ok = [title for title, res in fresh.items() if res.ok]
+            if language != "English" and ok:
+                for title, translated in zip(ok, tools.translate_batch([fresh[title].text for title in ok], language)):
+                    if translated.ok:
+                        fresh[title] = translated
+                    else:
+                        fresh[title] = tools.GeminiResult(False, fresh[title].text, translated.error)
+                        error_prefixes[title] = translation_failed
+            for title, res in fresh.items():
+                if res.ok:
+                    cache_store(title, res.text)
+                results[title] = res.message(error_prefixes[title])
+            st.session_state.chat_history.extend(results.items())
+            st.success("All analyses complete")
+
 st.markdown("</div>", unsafe_allow_html=True)
 
 # ---------- Show results ----------
 if st.session_state.chat_history:
     st.markdown("<hr>", unsafe_allow_html=True)
     st.markdown("<h3>Results</h3>", unsafe_allow_html=True)
-    for title, content in reversed(st.session_state.chat_history):
-        st.markdown(f"{title}")
-        st.text_area(label="", value=content, height=220, key=f"ta_{hash(title+content) % 1_000_000}")
+    # Static markdown in expanders: no widget state per result, newest one open.
+    for idx, (title, content) in enumerate(reversed(st.session_state.chat_history)):
+        with st.expander(title, expanded=(idx == 0)):
+            st.markdown(content)
 
 # ---------- Footer ----------
 st.markdown("---")
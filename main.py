@@ -1,15 +1,62 @@
+import asyncio
+import datetime
+import hashlib
+import importlib.util
+import json
+import multiprocessing
 import os
+import re
+import textwrap
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
 from dotenv import load_dotenv
 import google.generativeai as genai
-from pypdf import PdfReader
+from google.api_core import exceptions as api_exceptions, retry
+from google.generativeai import caching
 
-# Optional OCR + Translation
+import _gemini_cache
+import _pdf_text
+
+# Optional language detection, used to skip translating text already in the target language.
+# Deliberately not in requirements.txt: gcld3 ships no wheels, and building it needs protoc and
+# a C++ toolchain. Install it (pip install gcld3) where those are available.
+try:
+    import gcld3
+    LANGUAGE_DETECTION_ENABLED = True
+except ImportError:
+    LANGUAGE_DETECTION_ENABLED = False
+
+# Optional tokenizer, so prompt windows are bounded by tokens rather than characters
 try:
-    from google.cloud import vision
-    from google.cloud import translate_v2 as translate
-    OCR_ENABLED = True
+    import tiktoken
+    TOKENIZER_ENABLED = True
 except ImportError:
-    OCR_ENABLED = False
+    TOKENIZER_ENABLED = False
+
+# Optional OCR + Translation. Only probed here: the libraries pull in gRPC and protobuf,
+# so they are imported on first use (see _load_cloud) rather than at startup.
+def _installed(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:
+        return False
+
+OCR_ENABLED = _installed("google.cloud.vision") and _installed("google.cloud.translate_v2")
+vision = translate = None
+_CLOUD_LOCK = threading.Lock()
+
+def _load_cloud():
+    global vision, translate
+    if vision is None:
+        with _CLOUD_LOCK:
+            if vision is None:
+                from google.cloud import translate_v2
+                from google.cloud import vision as vision_module
+                translate = translate_v2
+                vision = vision_module
 
 
 load_dotenv()
@@ -20,47 +67,497 @@ if not API_KEY:
 
 # Configure Gemini
 genai.configure(api_key=API_KEY)
-model = genai.GenerativeModel("gemini-1.5-flash")
+MODEL_NAME = "gemini-1.5-flash"
 
-# ----------------- Document Extraction -----------------
-def extract_text_from_pdfs(pdf_files) -> str:
+@lru_cache(maxsize=None)
+def get_model(name: str = MODEL_NAME):
+    """Process-wide GenerativeModel, created on first use and shared by every session and thread."""
+    return genai.GenerativeModel(name)
+
+# Explicit context caching needs a versioned model and a minimum context size
+# (32,768 tokens for Gemini 1.5); smaller documents are sent inline as before.
+CACHE_MODEL_NAME = "models/gemini-1.5-flash-001"
+CACHE_MIN_TOKENS = 32768
+# Rough ratio for estimating tokens from length; with a tokenizer, character windows become token budgets at this rate.
+CHARS_PER_TOKEN = 4
+CACHE_TTL_SECONDS = 1800
+
+# Default document window (characters) for key information and risk assessment;
+# the app lets users raise it for long documents.
+DEFAULT_CONTEXT_CHARS = 4000
+
+# ----------------- Gemini Context Caching -----------------
+def create_document_cache(text: str) -> str:
+    """
+    Upload the document once as a Gemini cached context so each analysis
+    only sends its short task prompt. Returns the cache name, or "" if the
+    document is too small to cache or the API refused to create the cache.
     """
-    Extract text from multiple PDF files.
-    Falls back to OCR if needed and OCR is enabled.
-    Returns merged text from all files.
+    # Estimated from length; avoids a count_tokens round trip.
+    if len(text) // CHARS_PER_TOKEN < CACHE_MIN_TOKENS:
+        return ""
+    try:
+        cache = caching.CachedContent.create(
+            model=CACHE_MODEL_NAME,
+            display_name="legal-document",
+            contents=[{"role": "user", "parts": [text]}],
+            ttl=datetime.timedelta(seconds=CACHE_TTL_SECONDS),
+        )
+        return cache.name
+    except api_exceptions.GoogleAPICallError:
+        return ""  # Quota, permissions or model support; analyses send the document inline instead
+
+def delete_document_cache(name: str) -> None:
+    """Delete a cached context created by create_document_cache."""
+    if not name:
+        return
+    try:
+        caching.CachedContent.get(name).delete()
+    except Exception:
+        pass
+    _cached_model.cache_clear()
+
+@lru_cache(maxsize=16)
+def _cached_model(cached_content: str):
+    return genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+
+# ----------------- Request Limiting -----------------
+# One Streamlit process serves every tab, so cap in-flight Gemini requests
+# process-wide; extra requests wait here instead of tripping rate limits.
+MAX_CONCURRENT_REQUESTS = 4
+_GEMINI_SEM = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+
+def gemini_queue_full() -> bool:
+    """True when every Gemini request slot is taken, so a new request will wait."""
+    return _GEMINI_SEM._value == 0
+
+# Output budgets: classification needs a label and a sentence; analyses are bounded reports.
+_CONFIG_SHORT = genai.types.GenerationConfig(max_output_tokens=128, temperature=0.2)
+_CONFIG_LONG = genai.types.GenerationConfig(max_output_tokens=2048, temperature=0.4)
+
+# Rate limits (429) and brief outages (503) are retried with exponential backoff before
+# any error reaches the callers' failure messages.
+_REQUEST_OPTIONS = {
+    "retry": retry.Retry(
+        predicate=retry.if_exception_type(api_exceptions.ResourceExhausted, api_exceptions.ServiceUnavailable),
+        initial=0.5, maximum=8.0, multiplier=2.0, timeout=60.0,
+    ),
+}
+
+@dataclass
+class GeminiResult:
+    """
+    Outcome of a Gemini call. `text` is the response, or whatever had arrived
+    when the call failed; `error` is the exception that stopped it.
     """
-    all_text = ""
+    ok: bool
+    text: str
+    error: Optional[Exception] = None
+
+    def message(self, error_prefix: str) -> str:
+        """User-facing text: the response, or any partial output followed by `error_prefix` and the error on its own line."""
+        if self.ok:
+            return self.text
+        separator = "\n\n" if self.text else ""
+        return f"{self.text}{separator}{error_prefix}{str(self.error)}"
+
+# Calls in progress, by response-cache key
+_INFLIGHT = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+def _generate(prompt: str, cached_content: str = "", generation_config=None, cache: bool = True) -> GeminiResult:
+    """
+    Run a prompt against Gemini, on top of the cached document context if given.
+    Responses are cached by prompt hash; failures come back with ok=False and are never cached.
+    """
+    # The cached-context name is part of the key: with it the prompt alone doesn't identify the document.
+    key = _gemini_cache.make_key(MODEL_NAME, cached_content, repr(generation_config), prompt)
+    if cache:
+        cached = _gemini_cache.get(key)
+        if cached is not None:
+            return GeminiResult(True, cached)
+
+    # Singleflight: concurrent identical requests (other sessions, Run All racing a button)
+    # wait on the first caller's call instead of each paying for their own.
+    with _INFLIGHT_LOCK:
+        inflight = _INFLIGHT.get(key)
+        if inflight is None:
+            _INFLIGHT[key] = future = Future()
+    if inflight is not None:
+        return inflight.result()
+
+    try:
+        target = _cached_model(cached_content) if cached_content else get_model()
+        with _GEMINI_SEM:
+            response = target.generate_content(prompt, generation_config=generation_config, request_options=_REQUEST_OPTIONS)
+        result = GeminiResult(True, response.text.strip())
+        if cache:
+            _gemini_cache.put(key, result.text)
+    except Exception as e:
+        result = GeminiResult(False, "", e)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _INFLIGHT_LOCK:
+            del _INFLIGHT[key]
+    future.set_result(result)
+    return result
+
+class GeminiStream:
+    """
+    Gemini's response text as it arrives: iterate it for the chunks (st.write_stream takes it as is).
+    Once iteration ends, `result` holds the outcome as a GeminiResult.
+    Shares _generate's response cache: a hit is yielded in one piece, and a completed stream is stored.
+    """
+    def __init__(self, prompt: str, cached_content: str = "", generation_config=None):
+        self.prompt = prompt
+        self.cached_content = cached_content
+        self.generation_config = generation_config
+        self.result = None
+
+    def __iter__(self):
+        key = _gemini_cache.make_key(MODEL_NAME, self.cached_content, repr(self.generation_config), self.prompt)
+        cached = _gemini_cache.get(key)
+        if cached is not None:
+            self.result = GeminiResult(True, cached)
+            yield cached
+            return
+
+        parts = []
+        try:
+            # Resolving a cached context is an API call: an expired or deleted cache fails here.
+            target = _cached_model(self.cached_content) if self.cached_content else get_model()
+            with _GEMINI_SEM:
+                for chunk in target.generate_content(self.prompt, generation_config=self.generation_config, stream=True, request_options=_REQUEST_OPTIONS):
+                    parts.append(chunk.text)
+                    yield chunk.text
+        except Exception as e:
+            self.result = GeminiResult(False, "".join(parts).strip(), e)
+            return
+
+        self.result = GeminiResult(True, "".join(parts).strip())
+        _gemini_cache.put(key, self.result.text)
+
+def _message_stream(stream: GeminiStream, error_prefix: str):
+    """A GeminiStream's chunks for callers that want plain text; a failure is yielded last, on its own line."""
+    yield from stream
+    if not stream.result.ok:
+        separator = "\n\n" if stream.result.text else ""
+        yield f"{separator}{error_prefix}{str(stream.result.error)}"
+
+@lru_cache(maxsize=1)
+def _encoding():
+    # cl100k_base is an offline stand-in for Gemini's tokenizer (counting with Gemini is an API call).
+    # Its vocabulary is downloaded on first use and cached by tiktoken (TIKTOKEN_CACHE_DIR); hosts
+    # without internet access need that cache pre-seeded at deploy time, or windows fall back to characters.
+    if not TOKENIZER_ENABLED:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+# Load (or download) the vocabulary in the background at import, so it overlaps PDF
+# extraction and classification instead of stalling the first prompt build.
+if TOKENIZER_ENABLED:
+    threading.Thread(target=_encoding, daemon=True).start()
+
+def _window(text: str, max_chars: int) -> str:
+    """Bound text to max_chars, keeping its start and end (parties up front, signatures and schedules at the back)."""
+    encoding = _encoding()
+    if encoding is None:
+        if len(text) <= max_chars:
+            return text
+        half = max_chars // 2
+        return text[:half] + "\n...[truncated]...\n" + text[-half:]
+
+    max_tokens = max_chars // CHARS_PER_TOKEN
+    # A token is never shorter than one character, so text this short fits without encoding.
+    if len(text) <= max_tokens:
+        return text
+    half = max_tokens // 2
+    # Only the ends survive truncation, so a long document only has bounded slices at each end encoded.
+    span = max_chars * 2
+    if len(text) > 2 * span:
+        head = encoding.encode(text[:span], disallowed_special=())
+        tail = encoding.encode(text[-span:], disallowed_special=())
+        if len(head) >= half and len(tail) >= half:
+            return encoding.decode(head[:half]) + "\n...[truncated]...\n" + encoding.decode(tail[-half:])
+
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:half]) + "\n...[truncated]...\n" + encoding.decode(tokens[-half:])
+
+def _document(text: str, limit: int, cached_content: str = "") -> str:
+    """Document window for a prompt, or a pointer to the cached context when one is in use."""
+    if cached_content:
+        return "[The full document is provided in the cached context.]"
+    return _window(text, limit)
+
+# ----------------- Upload Cache -----------------
+# Extracted text and document types are stored on disk by content hash, so
+# re-uploading a document (even after Clear Session) skips the work.
+PDF_CACHE_DIR = os.path.join(".cache", "pdfs")
+DOCTYPE_CACHE_DIR = os.path.join(".cache", "doctype")
+
+def _file_bytes(pdf_file) -> bytes:
+    if hasattr(pdf_file, "getvalue"):
+        return pdf_file.getvalue()
+    pdf_file.seek(0)
+    content = pdf_file.read()
+    pdf_file.seek(0)
+    return content
 
-    for pdf_file in pdf_files:
-        text = ""
+def _fingerprint(contents) -> str:
+    digest = hashlib.sha256()
+    for content in contents:
+        digest.update(hashlib.sha256(content).digest())
+    return digest.hexdigest()
 
-        # Try normal PDF text extraction
+def _read_cache(directory: str, key: str):
+    try:
+        with open(os.path.join(directory, f"{key}.txt"), encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _write_cache(directory: str, key: str, text: str) -> None:
+    path = os.path.join(directory, f"{key}.txt")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        # Write then rename so concurrent sessions never read a partial file.
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+# ----------------- Document Extraction -----------------
+@lru_cache(maxsize=1)
+def _vision_client():
+    # One Vision client per process; its gRPC channel is reused across OCR calls and threads.
+    _load_cloud()
+    return vision.ImageAnnotatorClient()
+
+# pypdf is pure Python and holds the GIL, so long documents it has to parse are split into
+# page ranges for worker processes. PDFium is fast enough in-process.
+PARALLEL_PAGE_THRESHOLD = 40
+PAGES_PER_WORKER = 20
+
+@lru_cache(maxsize=1)
+def _process_pool():
+    # Started on first use and reused; spawn avoids forking a process running gRPC and Streamlit threads.
+    # Workers only import _pdf_text, not this module and its Gemini setup.
+    return ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context("spawn"))
+
+def _extract_one(content: bytes) -> list:
+    """Extract the text layer of a single PDF, one string per page ([] if it can't be parsed)."""
+    try:
+        num_pages = _pdf_text.page_count(content)
+    except Exception:
+        return []
+
+    if _pdf_text.PDFIUM_ENABLED:
         try:
-            reader = PdfReader(pdf_file)
-            for page in reader.pages:
-                text += page.extract_text() or ""
+            return _pdf_text.pdfium_pages(content, 0, num_pages)
         except Exception:
-            pass
+            pass  # Fall back to pypdf
+
+    workers = min(os.cpu_count() or 1, num_pages // PAGES_PER_WORKER)
+    if num_pages > PARALLEL_PAGE_THRESHOLD and workers > 1:
+        bounds = [num_pages * i // workers for i in range(workers + 1)]
+        try:
+            futures = [_process_pool().submit(_pdf_text.pypdf_pages, content, bounds[i], bounds[i + 1]) for i in range(workers)]
+            return [page for future in futures for page in future.result()]
+        except Exception:
+            pass  # Pool unavailable; parse in-process
+
+    try:
+        return _pdf_text.pypdf_pages(content, 0, num_pages)
+    except Exception:
+        return []
 
-        # Fallback to OCR if no text
-        if OCR_ENABLED and not text.strip():
-            try:
-                pdf_file.seek(0)
-                client = vision.ImageAnnotatorClient()
-                content = pdf_file.read()
-                image = vision.Image(content=content)
-                response = client.text_detection(image=image)
-                text = response.full_text_annotation.text if response.text_annotations else ""
-            except Exception as e:
-                text = f"[OCR failed: {e}]"
+# Pages whose text layer is shorter than this are treated as scanned and sent to OCR
+MIN_PAGE_CHARS = 50
+OCR_PAGES_PER_REQUEST = 5
 
-        all_text += text.strip() + "\n\n--- End of Document ---\n\n"
+def _batch_ocr(jobs: list) -> list:
+    """
+    OCR pages of scanned PDFs with Vision's files:annotate endpoint, which reads PDF
+    pages directly. `jobs` holds (pdf bytes, 0-based page indexes or None for the
+    first pages); returns one {page index: text} dict per job.
+    """
+    try:
+        client = _vision_client()
+    except Exception as e:
+        return [{page: f"[OCR failed: {e}]" for page in pages or [0]} for _, pages in jobs]
+    feature = vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
+    requests = []
+    for job, (content, pages) in enumerate(jobs):
+        input_config = vision.InputConfig(content=content, mime_type="application/pdf")
+        if pages is None:
+            requests.append((job, vision.AnnotateFileRequest(input_config=input_config, features=[feature])))
+            continue
+        for start in range(0, len(pages), OCR_PAGES_PER_REQUEST):
+            group = [page + 1 for page in pages[start:start + OCR_PAGES_PER_REQUEST]]
+            requests.append((job, vision.AnnotateFileRequest(input_config=input_config, features=[feature], pages=group)))
 
-    return all_text.strip()
+    def annotate(item):
+        # The synchronous endpoint accepts one file and up to 5 pages per call;
+        # the calls are sent concurrently over the shared client instead.
+        job, request = item
+        try:
+            response = client.batch_annotate_files(requests=[request])
+            return job, {page.context.page_number - 1: page.full_text_annotation.text.strip() for page in response.responses[0].responses}
+        except Exception as e:
+            pages = [page - 1 for page in request.pages] or [0]
+            return job, {page: f"[OCR failed: {e}]" for page in pages}
+
+    results = [{} for _ in jobs]
+    with ThreadPoolExecutor(max_workers=min(8, len(requests))) as executor:
+        for job, texts in executor.map(annotate, requests):
+            results[job].update(texts)
+    return results
+
+def _apply_ocr(pages: list, ocr: dict) -> list:
+    """Merge OCR output into a file's page texts."""
+    if not any(text.strip() for text in pages):
+        # Fully scanned: OCR is the only text there is, failures included.
+        return [ocr[page] for page in sorted(ocr)]
+    pages = list(pages)
+    for page, text in ocr.items():
+        # A scanned page inside a text PDF: keep whichever reading has more text.
+        if page < len(pages) and not text.startswith("[OCR failed:") and len(text) > len(pages[page].strip()):
+            pages[page] = text
+    return pages
+
+def extract_text_from_pdfs(pdf_files, on_cache_hit=None) -> str:
+    """
+    Extract text from multiple PDF files, one worker thread per file.
+    Falls back to OCR for scanned files and pages if OCR is enabled.
+    Returns merged text from all files, in upload order.
+    Results are cached on disk by file content, so re-uploads skip parsing;
+    `on_cache_hit`, if given, is called with no arguments when that happens.
+    """
+    pdf_files = list(pdf_files)
+    if not pdf_files:
+        return ""
+
+    # Read each file once; the same bytes feed the fingerprint, the parsers and OCR.
+    contents = [_file_bytes(pdf_file) for pdf_file in pdf_files]
+    key = _fingerprint(contents)
+    cached = _read_cache(PDF_CACHE_DIR, key)
+    if cached is not None:
+        if on_cache_hit is not None:
+            on_cache_hit()
+        return cached
+
+    with ThreadPoolExecutor(max_workers=min(8, len(pdf_files))) as executor:
+        pages = list(executor.map(_extract_one, contents))
+
+    # OCR only what has no usable text layer (a scanned cover or annex doesn't OCR the whole file), all in one batch
+    if OCR_ENABLED:
+        jobs = {}
+        for i, file_pages in enumerate(pages):
+            short = [page for page, text in enumerate(file_pages) if len(text.strip()) < MIN_PAGE_CHARS]
+            if short or not file_pages:
+                jobs[i] = short or None
+        if jobs:
+            for i, ocr in zip(jobs, _batch_ocr([(contents[i], short) for i, short in jobs.items()])):
+                pages[i] = _apply_ocr(pages[i], ocr)
+
+    texts = ["\n".join(file_pages).strip() for file_pages in pages]
+    all_text = "".join(text + "\n\n--- End of Document ---\n\n" for text in texts).strip()
+
+    if "[OCR failed:" not in all_text:
+        _write_cache(PDF_CACHE_DIR, key, all_text)
+    return all_text
+
+# ----------------- Content Guard -----------------
+MIN_ANALYZABLE_CHARS = 200
+INSUFFICIENT_CONTENT = "Insufficient document content for analysis."
+
+# OCR error placeholders and the separators between uploaded files carry no document content.
+_NON_CONTENT_RE = re.compile(r"^(?:\[OCR failed: .*?\]|--- End of Document ---)$", re.MULTILINE | re.DOTALL)
+
+def is_analyzable(text: str) -> bool:
+    """False for empty or near-empty text once OCR errors and file separators are removed; not worth a Gemini call."""
+    return bool(text) and len(_NON_CONTENT_RE.sub("", text).strip()) > MIN_ANALYZABLE_CHARS
 
 # ----------------- Domain-Specific Intelligence -----------------
+# Part of the classification cache key; bump it when classification changes so answers
+# stored by an earlier classifier are not reused.
+DOCTYPE_CACHE_VERSION = "2"
+
+def _doc_type_key(text: str) -> str:
+    # Classification only looks at the first 1000 characters.
+    return hashlib.blake2b(f"{DOCTYPE_CACHE_VERSION}|{text[:1000]}".encode("utf-8"), digest_size=16).hexdigest()
+
+def _doc_category(doc_type: str) -> str:
+    """Canonical category for prompts and cache keys: "Legal Contract/Agreement ..." -> "Legal Contract"."""
+    return doc_type.split('/')[0].strip()
+
 def detect_document_type(text: str) -> str:
-    """Detect the type of legal/medical document using Gemini."""
+    """Detect the type of legal/medical document, locally when clear-cut, else with Gemini (cached by content)."""
+    if not is_analyzable(text):
+        return INSUFFICIENT_CONTENT
+    try:
+        return _classify(_doc_type_key(text), text[:1000])
+    except Exception as e:
+        return f"Document Classification (Error: {str(e)})"
+
+# Local fast path for classification: distinctive terms per category, matched as whole words.
+# Terms are regex fragments, so plurals (s?) and stems (\w*) are spelled out where they're wanted.
+# Only a clear winner is accepted; anything ambiguous goes to Gemini.
+_DOC_TYPE_TERMS = {
+    "Legal Contract/Agreement": [r"agreements?", r"contracts?", r"whereas", r"hereinafter", r"witnesseth", r"in witness whereof",
+                                 r"parties", r"indemnif\w*", r"breach(?:es)?", r"governing law"],
+    "Medical Policy/Insurance": [r"insured", r"insurer", r"premiums?", r"deductibles?", r"co-pays?", r"sum insured",
+                                 r"policyholders?", r"policy holders?", r"coverage", r"claims?"],
+    "Terms of Service": [r"terms of service", r"terms of use", r"terms and conditions", r"acceptable use",
+                         r"your account", r"the service", r"website", r"users?"],
+    "Privacy Policy": [r"privacy", r"personal data", r"personal information", r"cookies", r"data protection",
+                       r"we collect", r"data controller", r"gdpr"],
+    "Medical Report/Prescription": [r"patients?", r"diagnos[ie]s", r"prescriptions?", r"dosages?", r"mg", r"tablets?",
+                                    r"symptoms?", r"hospital", r"blood pressure", r"investigations?"],
+    "Government Document": [r"government of", r"ministry", r"gazette", r"notifications?", r"hereby notifies",
+                            r"department of", r"official seal", r"under section"],
+    "Employment Document": [r"employees?", r"employer", r"employment", r"salary", r"designation", r"offer letter",
+                            r"probation", r"notice period", r"joining", r"ctc"],
+}
+# One capturing group per term, so hits are counted per term rather than per distinct spelling.
+_DOC_TYPE_PATTERNS = {
+    label: re.compile(r"\b(?:" + "|".join(f"({term})" for term in terms) + r")\b")
+    for label, terms in _DOC_TYPE_TERMS.items()
+}
+LOCAL_CLASSIFIER_MIN_HITS = 4
+
+def _classify_locally(excerpt: str):
+    """Category from distinctive terms, or None when there is no clear winner."""
+    lowered = excerpt.lower()
+    # {term index: matched text} per category
+    hits = {label: {match.lastindex: match.group() for match in pattern.finditer(lowered)} for label, pattern in _DOC_TYPE_PATTERNS.items()}
+    ranked = sorted(hits.items(), key=lambda item: len(item[1]), reverse=True)
+    (label, terms), (_, runner_up) = ranked[0], ranked[1]
+    if len(terms) < LOCAL_CLASSIFIER_MIN_HITS or len(terms) < 2 * len(runner_up):
+        return None
+    return f"{label}\n\nThe opening text uses terms typical of this category ({', '.join(sorted(terms.values()))})."
+
+@lru_cache(maxsize=1024)
+def _classify(key: str, excerpt: str) -> str:
+    # Memoized in memory on top of the disk cache; failures raise, so they are never memoized.
+    cached = _read_cache(DOCTYPE_CACHE_DIR, key)
+    if cached is not None:
+        return cached
+
+    doc_type = _classify_locally(excerpt)
+    if doc_type is not None:
+        _write_cache(DOCTYPE_CACHE_DIR, key, doc_type)
+        return doc_type
+
     prompt = f"""
     Analyze this document and classify it into one of these categories:
     - Legal Contract/Agreement
@@ -72,21 +569,18 @@ def detect_document_type(text: str) -> str:
     - Employment Document
     - Other Legal Document
     
-    Document text: {text[:1000]}
+    Document text: {excerpt}
     
     Respond with just the category name and a brief explanation (1-2 sentences).
     """
-    try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        return f"Document Classification (Error: {str(e)})"
+    result = _generate(prompt, generation_config=_CONFIG_SHORT)
+    if not result.ok:
+        raise result.error
+    _write_cache(DOCTYPE_CACHE_DIR, key, result.text)
+    return result.text
 
-def extract_key_entities(text: str, doc_type: str) -> str:
-    """Extract domain-specific key entities based on document type."""
-    
-    entity_prompts = {
-        "Legal Contract": """
+_ENTITY_PROMPTS = {
+    "Legal Contract": """
         Extract these key legal elements from this contract:
         - Parties involved (who are the contracting parties)
         - Contract duration/important dates
@@ -97,7 +591,7 @@ def extract_key_entities(text: str, doc_type: str) -> str:
         - Governing law/jurisdiction
         """,
         
-        "Medical Policy": """
+    "Medical Policy": """
         Extract these medical policy elements:
         - Coverage details (what's included)
         - Premium amounts and payment schedule
@@ -108,7 +602,7 @@ def extract_key_entities(text: str, doc_type: str) -> str:
         - Policy period and renewal terms
         """,
         
-        "Medical Report": """
+    "Medical Report": """
         Extract these medical elements:
         - Diagnosis or medical findings
         - Prescribed medications and dosages
@@ -119,7 +613,7 @@ def extract_key_entities(text: str, doc_type: str) -> str:
         - Warning signs to watch for
         """,
         
-        "Employment Document": """
+    "Employment Document": """
         Extract these employment elements:
         - Job title and responsibilities
         - Salary and benefits
@@ -129,32 +623,40 @@ def extract_key_entities(text: str, doc_type: str) -> str:
         - Termination conditions
         - Confidentiality requirements
         """
-    }
+}
+
+def build_key_entities_prompt(text: str, doc_type: str, cached_content: str = "", max_chars: int = DEFAULT_CONTEXT_CHARS) -> str:
+    """Build the Gemini prompt used by extract_key_entities."""
     
-    base_prompt = entity_prompts.get(doc_type.split('/')[0], "Extract key information from this document:")
+    base_prompt = _ENTITY_PROMPTS.get(_doc_category(doc_type), "Extract key information from this document:")
     
     prompt = f"""
     You are an expert legal/medical document analyst. 
     
     {base_prompt}
     
-    Document: {text[:4000]}
+    Document: {_document(text, max_chars, cached_content)}
     
     Present the information in a clear, structured format with bullet points.
     Focus only on information that is explicitly mentioned in the document.
     """
-    
-    try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        return f"Key entity extraction failed: {str(e)}"
+    return prompt
 
-def generate_compliance_checklist(text: str, doc_type: str) -> str:
-    """Generate a compliance or action checklist based on document type."""
-    
-    checklist_prompts = {
-        "Legal Contract": """
+def extract_key_entities(text: str, doc_type: str, cached_content: str = "", max_chars: int = DEFAULT_CONTEXT_CHARS) -> str:
+    """Extract domain-specific key entities based on document type."""
+    if not is_analyzable(text):
+        return INSUFFICIENT_CONTENT
+    return _generate(build_key_entities_prompt(text, doc_type, cached_content, max_chars), cached_content, _CONFIG_LONG).message("Key entity extraction failed: ")
+
+def extract_key_entities_stream(text: str, doc_type: str, cached_content: str = "", max_chars: int = DEFAULT_CONTEXT_CHARS):
+    """Stream extract_key_entities output chunk by chunk as Gemini generates it."""
+    if not is_analyzable(text):
+        yield INSUFFICIENT_CONTENT
+        return
+    yield from _message_stream(GeminiStream(build_key_entities_prompt(text, doc_type, cached_content, max_chars), cached_content, _CONFIG_LONG), "Key entity extraction failed: ")
+
+_CHECKLIST_PROMPTS = {
+    "Legal Contract": """
         Create a practical checklist for someone who needs to comply with this contract:
         - Pre-signing requirements (what to verify before signing)
         - Important deadlines and dates to remember
@@ -164,7 +666,7 @@ def generate_compliance_checklist(text: str, doc_type: str) -> str:
         - Warning signs of potential issues
         """,
         
-        "Medical Policy": """
+    "Medical Policy": """
         Create an actionable checklist for policy holders:
         - How to file claims (step-by-step process)
         - Important deadlines for claims and renewals
@@ -174,7 +676,7 @@ def generate_compliance_checklist(text: str, doc_type: str) -> str:
         - Cost-saving tips based on policy terms
         """,
         
-        "Medical Report": """
+    "Medical Report": """
         Create a patient action checklist:
         - Medications to take (names, dosages, timing)
         - Lifestyle changes recommended
@@ -184,7 +686,7 @@ def generate_compliance_checklist(text: str, doc_type: str) -> str:
         - Questions to ask at next appointment
         """,
         
-        "Employment Document": """
+    "Employment Document": """
         Create an employee checklist:
         - Onboarding requirements to complete
         - Key policies to understand and follow
@@ -193,35 +695,46 @@ def generate_compliance_checklist(text: str, doc_type: str) -> str:
         - Required training or certifications
         - Important contacts and reporting procedures
         """
-    }
+}
+
+def build_checklist_prompt(text: str, doc_type: str, cached_content: str = "") -> str:
+    """Build the Gemini prompt used by generate_compliance_checklist."""
     
-    base_prompt = checklist_prompts.get(doc_type.split('/')[0], "Create an action checklist based on this document:")
+    base_prompt = _CHECKLIST_PROMPTS.get(_doc_category(doc_type), "Create an action checklist based on this document:")
     
     prompt = f"""
     {base_prompt}
     
-    Document: {text[:4000]}
+    Document: {_document(text, 4000, cached_content)}
     
     Format as a clear, actionable checklist with specific items they can act on.
     Use checkboxes (- [ ]) format for each actionable item.
     """
-    
-    try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        return f"Checklist generation failed: {str(e)}"
+    return prompt
 
-def explain_complex_terms(text: str, doc_type: str) -> str:
-    """Explain complex legal/medical terms found in the document."""
+def generate_compliance_checklist(text: str, doc_type: str, cached_content: str = "") -> str:
+    """Generate a compliance or action checklist based on document type."""
+    if not is_analyzable(text):
+        return INSUFFICIENT_CONTENT
+    return _generate(build_checklist_prompt(text, doc_type, cached_content), cached_content, _CONFIG_LONG).message("Checklist generation failed: ")
+
+def generate_compliance_checklist_stream(text: str, doc_type: str, cached_content: str = ""):
+    """Stream generate_compliance_checklist output chunk by chunk as Gemini generates it."""
+    if not is_analyzable(text):
+        yield INSUFFICIENT_CONTENT
+        return
+    yield from _message_stream(GeminiStream(build_checklist_prompt(text, doc_type, cached_content), cached_content, _CONFIG_LONG), "Checklist generation failed: ")
+
+def build_terms_prompt(text: str, doc_type: str, cached_content: str = "") -> str:
+    """Build the Gemini prompt used by explain_complex_terms."""
     
     prompt = f"""
-    You are an expert in {doc_type} who specializes in explaining complex terms to everyday people.
+    You are an expert in {_doc_category(doc_type)} who specializes in explaining complex terms to everyday people.
     
     Analyze this document and find complex legal, medical, or technical terms that regular people might not understand.
     For each term, provide a simple explanation in plain language.
     
-    Document: {text[:4000]}
+    Document: {_document(text, 4000, cached_content)}
     
     Format each explanation as:
     **[Term]**: Simple explanation in everyday language
@@ -229,18 +742,23 @@ def explain_complex_terms(text: str, doc_type: str) -> str:
     Only include terms that actually appear in the document.
     Focus on the most important or confusing terms (maximum 10 terms).
     """
-    
-    try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        return f"Term explanation failed: {str(e)}"
+    return prompt
 
-def risk_assessment(text: str, doc_type: str) -> str:
-    """Assess potential risks or important considerations."""
-    
-    risk_prompts = {
-        "Legal Contract": """
+def explain_complex_terms(text: str, doc_type: str, cached_content: str = "") -> str:
+    """Explain complex legal/medical terms found in the document."""
+    if not is_analyzable(text):
+        return INSUFFICIENT_CONTENT
+    return _generate(build_terms_prompt(text, doc_type, cached_content), cached_content, _CONFIG_LONG).message("Term explanation failed: ")
+
+def explain_complex_terms_stream(text: str, doc_type: str, cached_content: str = ""):
+    """Stream explain_complex_terms output chunk by chunk as Gemini generates it."""
+    if not is_analyzable(text):
+        yield INSUFFICIENT_CONTENT
+        return
+    yield from _message_stream(GeminiStream(build_terms_prompt(text, doc_type, cached_content), cached_content, _CONFIG_LONG), "Term explanation failed: ")
+
+_RISK_PROMPTS = {
+    "Legal Contract": """
         Identify potential risks, concerns, or unfavorable terms in this contract:
         - Unusual or strict penalties
         - Vague or ambiguous language that could cause problems
@@ -250,7 +768,7 @@ def risk_assessment(text: str, doc_type: str) -> str:
         - Difficult termination conditions
         """,
         
-        "Medical Policy": """
+    "Medical Policy": """
         Identify potential issues or limitations with this medical policy:
         - Significant coverage gaps or exclusions
         - High out-of-pocket costs or deductibles
@@ -260,7 +778,7 @@ def risk_assessment(text: str, doc_type: str) -> str:
         - Waiting periods for coverage
         """,
         
-        "Medical Report": """
+    "Medical Report": """
         Identify important health considerations and warnings:
         - Serious conditions that require immediate attention
         - Potential drug interactions or side effects
@@ -270,7 +788,7 @@ def risk_assessment(text: str, doc_type: str) -> str:
         - Test results that need monitoring
         """,
         
-        "Employment Document": """
+    "Employment Document": """
         Identify potential employment concerns:
         - Unusual restrictive clauses (non-compete, etc.)
         - Unclear job expectations or responsibilities
@@ -279,31 +797,39 @@ def risk_assessment(text: str, doc_type: str) -> str:
         - Limited advancement opportunities
         - Concerning termination conditions
         """
-    }
+}
+
+def build_risk_prompt(text: str, doc_type: str, cached_content: str = "", max_chars: int = DEFAULT_CONTEXT_CHARS) -> str:
+    """Build the Gemini prompt used by risk_assessment."""
     
-    base_prompt = risk_prompts.get(doc_type.split('/')[0], "Identify important considerations and potential risks in this document:")
+    base_prompt = _RISK_PROMPTS.get(_doc_category(doc_type), "Identify important considerations and potential risks in this document:")
     
     prompt = f"""
     {base_prompt}
     
-    Document: {text[:4000]}
+    Document: {_document(text, max_chars, cached_content)}
     
     Present as clear warnings or considerations. Be specific about what to watch out for.
     Note: This is informational analysis, not professional legal or medical advice.
     """
-    
-    try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        return f"Risk assessment failed: {str(e)}"
+    return prompt
 
-# ----------------- Enhanced Gemini Helpers -----------------
-def ask_gemini(question: str, context: str, language: str = "English", doc_type: str = "") -> str:
-    """Ask Gemini a question with enhanced domain-specific context."""
-    if not context:
-        return "No content extracted from the documents."
+def risk_assessment(text: str, doc_type: str, cached_content: str = "", max_chars: int = DEFAULT_CONTEXT_CHARS) -> str:
+    """Assess potential risks or important considerations."""
+    if not is_analyzable(text):
+        return INSUFFICIENT_CONTENT
+    return _generate(build_risk_prompt(text, doc_type, cached_content, max_chars), cached_content, _CONFIG_LONG).message("Risk assessment failed: ")
+
+def risk_assessment_stream(text: str, doc_type: str, cached_content: str = "", max_chars: int = DEFAULT_CONTEXT_CHARS):
+    """Stream risk_assessment output chunk by chunk as Gemini generates it."""
+    if not is_analyzable(text):
+        yield INSUFFICIENT_CONTENT
+        return
+    yield from _message_stream(GeminiStream(build_risk_prompt(text, doc_type, cached_content, max_chars), cached_content, _CONFIG_LONG), "Risk assessment failed: ")
 
+# ----------------- Enhanced Gemini Helpers -----------------
+def build_question_prompt(question: str, context: str, language: str = "English", doc_type: str = "", cached_content: str = "") -> str:
+    """Build the Gemini prompt used by ask_gemini."""
     # Enhanced prompt with domain expertise
     domain_context = ""
     if doc_type:
@@ -313,7 +839,7 @@ def ask_gemini(question: str, context: str, language: str = "English", doc_type:
     {domain_context}You are helping someone understand their document in simple, clear language.
     
     Document Type: {doc_type}
-    Document Context: {context[:12000]}
+    Document Context: {_document(context, 12000, cached_content)}
     
     User Question: {question}
     
@@ -326,12 +852,22 @@ def ask_gemini(question: str, context: str, language: str = "English", doc_type:
     
     Answer:
     """
+    return prompt
 
-    try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        return f"I apologize, but I encountered an error while analyzing your question: {str(e)}"
+def ask_gemini(question: str, context: str, language: str = "English", doc_type: str = "", cached_content: str = "") -> str:
+    """Ask Gemini a question with enhanced domain-specific context."""
+    if not is_analyzable(context):
+        return INSUFFICIENT_CONTENT
+    return _generate(build_question_prompt(question, context, language, doc_type, cached_content), cached_content, _CONFIG_LONG).message(
+        "I apologize, but I encountered an error while analyzing your question: ")
+
+def ask_gemini_stream(question: str, context: str, language: str = "English", doc_type: str = "", cached_content: str = ""):
+    """Stream ask_gemini output chunk by chunk as Gemini generates it."""
+    if not is_analyzable(context):
+        yield INSUFFICIENT_CONTENT
+        return
+    yield from _message_stream(GeminiStream(build_question_prompt(question, context, language, doc_type, cached_content), cached_content, _CONFIG_LONG),
+                               "I apologize, but I encountered an error while analyzing your question: ")
 
 def simplify_text(text: str, doc_type: str = "") -> str:
     """Simplify complex legal/medical text into plain language."""
@@ -353,30 +889,24 @@ def simplify_text(text: str, doc_type: str = "") -> str:
     Text to simplify: {text[:6000]}
     """
     
-    try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        return f"Text simplification failed: {str(e)}"
+    return _generate(prompt, generation_config=_CONFIG_LONG).message("Text simplification failed: ")
 
-def summarize_text(text: str, doc_type: str = "") -> str:
-    """Generate a concise summary of the document(s)."""
-    if not text:
-        return "No content to summarize."
+# First match wins, so order matters
+_SUMMARY_FOCUS = {
+    "Legal Contract": "Focus on parties, obligations, terms, and key dates.",
+    "Medical": "Focus on coverage, costs, procedures, and important limitations.",
+    "Employment": "Focus on role, compensation, responsibilities, and key policies.",
+}
 
-    domain_focus = ""
-    if "Legal Contract" in doc_type:
-        domain_focus = "Focus on parties, obligations, terms, and key dates."
-    elif "Medical" in doc_type:
-        domain_focus = "Focus on coverage, costs, procedures, and important limitations."
-    elif "Employment" in doc_type:
-        domain_focus = "Focus on role, compensation, responsibilities, and key policies."
+def build_summary_prompt(text: str, doc_type: str = "", cached_content: str = "") -> str:
+    """Build the Gemini prompt used by summarize_text."""
+    domain_focus = next((focus for key, focus in _SUMMARY_FOCUS.items() if key in doc_type), "")
 
     prompt = f"""
     Create a comprehensive summary of this {doc_type} document.
     {domain_focus}
     
-    Document: {text[:8000]}
+    Document: {_document(text, 8000, cached_content)}
     
     Structure your summary with:
     1. Document Overview (what type of document and main purpose)
@@ -386,35 +916,153 @@ def summarize_text(text: str, doc_type: str = "") -> str:
     
     Keep it detailed but easy to understand.
     """
-    
-    try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        return f"Document summary failed: {str(e)}"
+    return prompt
+
+def summarize_text(text: str, doc_type: str = "", cached_content: str = "") -> str:
+    """Generate a concise summary of the document(s)."""
+    if not is_analyzable(text):
+        return INSUFFICIENT_CONTENT
+    return _generate(build_summary_prompt(text, doc_type, cached_content), cached_content, _CONFIG_LONG).message("Document summary failed: ")
+
+def summarize_text_stream(text: str, doc_type: str = "", cached_content: str = ""):
+    """Stream summarize_text output chunk by chunk as Gemini generates it."""
+    if not is_analyzable(text):
+        yield INSUFFICIENT_CONTENT
+        return
+    yield from _message_stream(GeminiStream(build_summary_prompt(text, doc_type, cached_content), cached_content, _CONFIG_LONG), "Document summary failed: ")
+
+# ----------------- Precomputed Analysis Prompts -----------------
+# Analyses offered by the app, in display order: title -> (prompt builder, failure prefix)
+ANALYSES = {
+    "Key Information": (build_key_entities_prompt, "Key entity extraction failed: "),
+    "Action Checklist": (build_checklist_prompt, "Checklist generation failed: "),
+    "Risk Assessment": (build_risk_prompt, "Risk assessment failed: "),
+    "Explain Terms": (build_terms_prompt, "Term explanation failed: "),
+    "Summary": (build_summary_prompt, "Document summary failed: "),
+}
+
+# Analyses whose prompt takes the max_chars document window.
+WINDOWED_ANALYSES = {"Key Information", "Risk Assessment"}
+
+def build_analysis_prompts(text: str, doc_type: str, cached_content: str = "", max_chars: int = DEFAULT_CONTEXT_CHARS) -> dict:
+    """
+    Build every analysis prompt for a document in one go, keyed by analysis title.
+    The prompts only change when the document, cached context or window does,
+    so callers can keep them and skip rebuilding on each request.
+    """
+    prompts = {}
+    for title, (builder, _) in ANALYSES.items():
+        if title in WINDOWED_ANALYSES:
+            prompts[title] = builder(text, doc_type, cached_content, max_chars)
+        else:
+            prompts[title] = builder(text, doc_type, cached_content)
+    return prompts
+
+def run_analysis(prompt: str, cached_content: str = "") -> GeminiResult:
+    """Run a prompt from build_analysis_prompts; a failure's message is the analysis' prefix in ANALYSES."""
+    return _generate(prompt, cached_content, _CONFIG_LONG)
+
+def run_analysis_stream(prompt: str, cached_content: str = "") -> GeminiStream:
+    """Stream a prompt from build_analysis_prompts chunk by chunk; `result` is set once the stream ends."""
+    return GeminiStream(prompt, cached_content, _CONFIG_LONG)
+
+# ----------------- Concurrency -----------------
+# Upper bound on concurrent calls per batch; the process-wide _GEMINI_SEM still applies.
+MAX_BATCH_CONCURRENCY = 8
+
+async def run_concurrently(calls: dict, limit: int = MAX_BATCH_CONCURRENCY) -> dict:
+    """
+    Run blocking Gemini-backed calls concurrently in worker threads, at most `limit` at a time.
+    Takes {name: zero-argument callable} and returns {name: result} in the same order.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def bounded(call):
+        async with semaphore:
+            return await asyncio.to_thread(call)
+
+    results = await asyncio.gather(*(bounded(call) for call in calls.values()))
+    return dict(zip(calls, results))
 
 # ----------------- Translation -----------------
+@lru_cache(maxsize=1)
+def _translate_client():
+    # One Cloud Translate client per process; creating it repeats credential discovery.
+    _load_cloud()
+    return translate.Client()
+
+_LANG_CODES = {
+    "English": "en",
+    "Hindi": "hi",
+    "Marathi": "mr",
+    "Kannada": "kn",
+}
+
+# Cloud Translate request limits: segments per request and (recommended) characters per segment/request
+TRANSLATE_MAX_SEGMENTS = 128
+TRANSLATE_SEGMENT_CHARS = 5000
+TRANSLATE_REQUEST_CHARS = 30000
+
+def _cloud_translate(texts: list, target_language: str) -> list:
+    """
+    Translate several texts with Cloud Translate, packing their paragraph chunks
+    into as few requests as the API limits allow. Errors propagate.
+    """
+    target = _LANG_CODES.get(target_language, "en")
+    segments, owners = [], []
+    for i, text in enumerate(texts):
+        for chunk in _split_chunks(text, TRANSLATE_SEGMENT_CHARS):
+            segments.append(chunk)
+            owners.append(i)
+
+    translated, batch, size = [], [], 0
+    def flush():
+        if batch:
+            results = _translate_client().translate(batch, target_language=target, format_="text")
+            translated.extend(result["translatedText"] for result in results)
+            batch.clear()
+    for segment in segments:
+        if len(batch) == TRANSLATE_MAX_SEGMENTS or size + len(segment) > TRANSLATE_REQUEST_CHARS:
+            flush()
+            size = 0
+        batch.append(segment)
+        size += len(segment)
+    flush()
+
+    parts = [[] for _ in texts]
+    for i, segment in zip(owners, translated):
+        parts[i].append(segment)
+    return ["\n\n".join(p) if p else texts[i] for i, p in enumerate(parts)]
+
+_DETECTOR_LOCK = threading.Lock()
+
+@lru_cache(maxsize=1)
+def _language_detector():
+    return gcld3.NNetLanguageIdentifier(min_num_bytes=0, max_num_bytes=1000)
+
+def _already_in(text: str, target_language: str) -> bool:
+    """True when text is reliably detected as already being in target_language."""
+    if not LANGUAGE_DETECTION_ENABLED:
+        return False
+    # The detector keeps per-call state, so translation threads take turns.
+    with _DETECTOR_LOCK:
+        result = _language_detector().FindLanguage(text=text[:1000])
+    return result.is_reliable and result.language == _LANG_CODES.get(target_language)
+
 def translate_text(text: str, target_language: str) -> str:
     """
     Translate text into the selected language.
     Uses Google Cloud Translate if available, else falls back to Gemini.
     """
-    if not text or target_language == "English":
-        return text
+    return _translate(text, target_language).message(f"Translation to {target_language} failed: ")
 
-    lang_map = {
-        "English": "en",
-        "Hindi": "hi",
-        "Kannada": "kn",
-    }
+def _translate(text: str, target_language: str) -> GeminiResult:
+    if not text.strip() or target_language == "English" or _already_in(text, target_language):
+        return GeminiResult(True, text)
 
-   
     if OCR_ENABLED:
         try:
-            translate_client = translate.Client()
-            target = lang_map.get(target_language, "en")
-            result = translate_client.translate(text, target_language=target)
-            return result["translatedText"]
+            return GeminiResult(True, _cloud_translate([text], target_language)[0])
         except Exception:
             pass  # Fall back to Gemini
 
@@ -427,8 +1075,89 @@ def translate_text(text: str, target_language: str) -> str:
     Text to translate: {text[:8000]}
     """
     
-    try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        return f"Translation to {target_language} failed: {str(e)}"
\ No newline at end of file
+    return _generate(prompt, cache=len(text) >= 200)  # short snippets are rarely repeated
+
+def _split_chunks(text: str, max_chars: int) -> list:
+    """Split text into chunks of at most max_chars, breaking on paragraph boundaries where possible."""
+    chunks, current = [], ""
+    for paragraph in text.split("\n\n"):
+        pieces = [paragraph] if len(paragraph) <= max_chars else textwrap.wrap(paragraph, max_chars, break_long_words=False, replace_whitespace=False)
+        for piece in pieces:
+            if current and len(current) + len(piece) + 2 > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+async def translate_text_parallel(text: str, target_language: str, chunk_chars: int = 1000) -> GeminiResult:
+    """
+    Translate text by splitting it into paragraph chunks and translating
+    them concurrently. Chunks are reassembled in their original order.
+    Fails as a whole, with the first chunk's error, if any chunk fails.
+    """
+    if not text.strip() or target_language == "English" or _already_in(text, target_language):
+        return GeminiResult(True, text)
+
+    if OCR_ENABLED:
+        # Cloud Translate takes every chunk in one batched request
+        try:
+            return GeminiResult(True, (await asyncio.to_thread(_cloud_translate, [text], target_language))[0])
+        except Exception:
+            pass  # Fall back to concurrent per-chunk translation
+
+    chunks = _split_chunks(text, chunk_chars)
+    translated = await asyncio.gather(*(asyncio.to_thread(_translate, chunk, target_language) for chunk in chunks))
+    failed = next((result for result in translated if not result.ok), None)
+    if failed is not None:
+        return GeminiResult(False, "", failed.error)
+    return GeminiResult(True, "\n\n".join(result.text for result in translated))
+
+def translate_batch(texts: list, target_language: str) -> list:
+    """
+    Translate several texts in one batched Cloud Translate call when available,
+    else with a single Gemini call that returns a JSON array.
+    Falls back to translating each text concurrently if the reply can't be used.
+    Returns one GeminiResult per text, in order.
+    """
+    texts = list(texts)
+    results = [GeminiResult(True, text) for text in texts]
+    if not texts or target_language == "English":
+        return results
+
+    # Blank texts and texts already in the target language pass through untouched.
+    pending = [i for i, text in enumerate(texts) if text.strip() and not _already_in(text, target_language)]
+    if pending:
+        for i, translated in zip(pending, _translate_many([texts[i] for i in pending], target_language)):
+            results[i] = translated
+    return results
+
+def _translate_many(texts: list, target_language: str) -> list:
+    if OCR_ENABLED:
+        try:
+            return [GeminiResult(True, text) for text in _cloud_translate(texts, target_language)]
+        except Exception:
+            pass  # Fall back to Gemini
+
+    prompt = f"""
+    Translate each element of the following JSON array of strings into {target_language}.
+    Maintain the formatting and structure of each original text.
+    Keep technical terms accurate.
+    Return only a JSON array with exactly {len(texts)} translated strings, in the same order.
+
+    {json.dumps(texts, ensure_ascii=False)}
+    """
+
+    reply = _generate(prompt, generation_config={"response_mime_type": "application/json"})
+    if reply.ok:
+        try:
+            translated = json.loads(reply.text)
+            if isinstance(translated, list) and len(translated) == len(texts) and all(isinstance(t, str) for t in translated):
+                return [GeminiResult(True, t) for t in translated]
+        except ValueError:
+            pass
+
+    # Fallback: one request per text, run concurrently.
+    results = asyncio.run(run_concurrently({i: (lambda t=t: _translate(t, target_language)) for i, t in enumerate(texts)}))
+    return list(results.values())